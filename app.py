@@ -1,119 +1,368 @@
 import streamlit as st
 import os
-import re
 import json
-import google.generativeai as genai
-from typing import List, Dict, Any
+import queue
+import threading
+import time
+import orjson
+from itertools import chain
+from typing import List, Dict, Any, Iterator, Callable, Tuple
+
+from core.prompt import QuizSchema, build_quiz_prompt
+from ui import render_quiz
 
 # ------------------- CONFIG ------------------- #
-GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")  # from Streamlit secrets or env var
+PROVIDER = os.getenv("PROVIDER", "gemini").lower()  # "hf" or "gemini", from Streamlit secrets or env var
+PROVIDER_NAMES = {"gemini": "Google Gemini", "hf": "Hugging Face"}
+
+PROVIDER_KEYS = {"gemini": os.getenv("GOOGLE_API_KEY"), "hf": os.getenv("HUGGINGFACE_API_TOKEN")}
+PROVIDER_MODELS = {
+    "gemini": os.getenv("GEMINI_MODEL_ID", "gemini-1.5-flash"),
+    "hf": os.getenv("HF_MODEL_ID", "mistralai/Mixtral-8x7B-Instruct-v0.1"),
+}
+if PROVIDER not in PROVIDER_NAMES:
+    PROVIDER = "gemini"
+API_KEY = PROVIDER_KEYS[PROVIDER]
+MODEL_ID = PROVIDER_MODELS[PROVIDER]
+
+# Opt-in: also start every other provider that has a key and keep whichever answers first
+RACE_PROVIDERS = os.getenv("RACE_PROVIDERS", "").lower() in ("1", "true", "yes")
+
+MAX_OUTPUT_TOKENS = 2048
 
 # ------------------- CUSTOM ERROR ------------------- #
 class AIError(Exception):
     """Custom error class for AI API failures."""
     pass
 
-# ------------------- GEMINI GENERATE FUNCTION ------------------- #
-def generate_gemini_response(prompt: str, api_key: str, model_id: str = "gemini-1.5-flash", 
-                           max_output_tokens: int = 1024, temperature: float = 0.7) -> str:
+# ------------------- GENERATE FUNCTIONS ------------------- #
+def stream_response(provider: str, prompt: str, model_id: str, api_key: str) -> Iterator[str]:
     """
-    Calls the Gemini API with the given prompt.
+    Yields text chunks from the selected provider as they arrive.
     
     Args:
+        provider (str): "gemini" or "hf".
         prompt (str): The input text / instruction.
-        api_key (str): Google AI Studio API key.
-        model_id (str): The Gemini model to use.
-        max_output_tokens (int): Maximum tokens to generate.
-        temperature (float): Creativity of the response (0-1).
-    
-    Returns:
-        str: The generated text from the model.
+        model_id (str): The model to use on that provider.
+        api_key (str): The provider's API key / token.
     
     Raises:
         AIError: If the API call fails or returns an error.
     """
     if not api_key:
-        raise AIError("Missing GOOGLE_API_KEY.")
+        raise AIError(f"Missing {PROVIDER_NAMES[provider]} API key.")
     
+    # Provider SDKs are imported on first use: google.generativeai pulls in grpc and
+    # google.auth, which would slow every cold start even when PROVIDER is "hf"
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_id)
-        response = model.generate_content(
-            prompt, 
-            generation_config=genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_output_tokens
-            )
-        )
-        
-        if not response or not response.text:
-            raise AIError("Empty response from Gemini.")
-            
-        return response.text.strip()
-        
+        if provider == "hf":
+            from providers import hf as hf_provider
+            yield from hf_provider.stream_generate(prompt, api_key, model_id, max_new_tokens=MAX_OUTPUT_TOKENS)
+        else:
+            from providers import gemini as gemini_provider
+            yield from gemini_provider.stream_generate(prompt, api_key, model_id, max_output_tokens=MAX_OUTPUT_TOKENS,
+                                                       response_schema=QuizSchema)
     except Exception as e:
-        raise AIError(f"Gemini API call failed: {str(e)}")
+        raise AIError(f"{PROVIDER_NAMES[provider]} API call failed: {str(e)}")
+
+def continue_response(provider: str, prompt: str, previous: str, followup: str, model_id: str, api_key: str) -> str:
+    """
+    Asks the model to extend its earlier reply instead of re-issuing the prompt.
+    Gemini gets a follow-up chat turn; Hugging Face gets the prompt, the reply
+    so far and the follow-up as one input over the same pooled session.
+    
+    Raises:
+        AIError: If the API call fails or returns an error.
+    """
+    try:
+        if provider == "hf":
+            from providers import hf as hf_provider
+            return "".join(hf_provider.stream_generate(f"{prompt}\n{previous}\n{followup}", api_key, model_id,
+                                                       max_new_tokens=MAX_OUTPUT_TOKENS))
+        from providers import gemini as gemini_provider
+        return gemini_provider.continue_generate(prompt, previous, followup, api_key, model_id,
+                                                 max_output_tokens=MAX_OUTPUT_TOKENS, response_schema=QuizSchema)
+    except Exception as e:
+        raise AIError(f"{PROVIDER_NAMES[provider]} API call failed: {str(e)}")
+
+# ------------------- RESPONSE CACHE ------------------- #
+RESPONSE_TTL = 3600  # seconds
+RESPONSE_CACHE_SIZE = 128
+
+@st.cache_resource
+def _response_cache() -> Tuple[threading.Lock, Dict[tuple, tuple]]:
+    """
+    Process-wide key -> (stored_at, text) store for replies that parsed into a
+    quiz, shared by every session's script thread and guarded by its lock.
+    A plain dict rather than st.cache_data around the call, because the call
+    streams into the page and cached functions must not touch elements created
+    outside them (Streamlit can't replay those on a cache hit).
+    """
+    return threading.Lock(), {}
+
+def _lookup_response(key: tuple):
+    lock, cache = _response_cache()
+    with lock:
+        hit = cache.get(key)
+    if hit and time.monotonic() - hit[0] < RESPONSE_TTL:
+        return hit[1]
+    return None
+
+def _store_response(key: tuple, text: str) -> None:
+    lock, cache = _response_cache()
+    with lock:
+        cache.pop(key, None)
+        cache[key] = (time.monotonic(), text)
+        while len(cache) > RESPONSE_CACHE_SIZE:
+            cache.pop(next(iter(cache)))  # dicts keep insertion order, so this is the oldest
+
+def active_providers() -> List[str]:
+    """The configured provider, plus any other provider with a key when racing is on."""
+    if not RACE_PROVIDERS:
+        return [PROVIDER]
+    return [PROVIDER] + [p for p in PROVIDER_NAMES if p != PROVIDER and PROVIDER_KEYS[p]]
+
+def race_response(providers: List[str], prompt: str) -> Tuple[str, Iterator[str]]:
+    """
+    Starts a stream on every provider at once and returns (provider, chunks) for
+    the first one to produce text. Slower streams are dropped and closed when
+    garbage-collected, so a stalled provider costs no extra wall time.
+    
+    Raises:
+        AIError: If every provider fails (the last failure is raised).
+    """
+    results = queue.Queue()
+
+    def start(provider: str) -> None:
+        chunks = stream_response(provider, prompt, PROVIDER_MODELS[provider], PROVIDER_KEYS[provider])
+        try:
+            first = next(chunks)
+        except StopIteration:
+            results.put((provider, None, AIError(f"Empty response from {PROVIDER_NAMES[provider]}.")))
+        except AIError as e:
+            results.put((provider, None, e))
+        else:
+            results.put((provider, chain([first], chunks), None))
+
+    for provider in providers:
+        threading.Thread(target=start, args=(provider,), daemon=True).start()
+
+    error = None
+    for _ in providers:
+        provider, chunks, error = results.get()
+        if chunks is not None:
+            return provider, chunks
+    raise error
+
+def generate_text(providers: List[str], prompt: str, placeholder=None) -> Tuple[str, str]:
+    """
+    Returns (provider, completion) for a prompt, racing the providers if there is
+    more than one, and streaming tokens into ``placeholder`` (if given) as they arrive.
+    
+    Raises:
+        AIError: If the API call fails or returns an empty response.
+    """
+    if len(providers) == 1:
+        provider = providers[0]
+        chunks = stream_response(provider, prompt, PROVIDER_MODELS[provider], PROVIDER_KEYS[provider])
+    else:
+        provider, chunks = race_response(providers, prompt)
+
+    if placeholder is None:
+        text = "".join(chunks)
+    else:
+        # Render tokens as they arrive so the user isn't staring at a spinner;
+        # clear them even if the stream fails partway, so only the error shows
+        try:
+            text = placeholder.write_stream(chunks)
+        finally:
+            placeholder.empty()
+    
+    if not text or not text.strip():
+        raise AIError(f"Empty response from {PROVIDER_NAMES[provider]}.")
+    return provider, text.strip()
 
 # ------------------- QUIZ FORMATTING ------------------- #
+_JSON_DECODER = json.JSONDecoder()
+
+def extract_json(text: str):
+    """
+    Decodes the first JSON object or array in the text, ignoring any preamble
+    (e.g. a ```json fence) and anything after the closing bracket.
+    
+    Raises:
+        json.JSONDecodeError: If the text holds no decodable JSON value.
+    """
+    start = min((i for i in (text.find('{'), text.find('[')) if i != -1), default=-1)
+    if start == -1:
+        raise json.JSONDecodeError("No JSON object or array found", text, 0)
+
+    # Fast path: the JSON usually runs up to the last closing bracket
+    end = max(text.rfind('}'), text.rfind(']')) + 1
+    try:
+        return orjson.loads(text[start:end])
+    except orjson.JSONDecodeError:
+        return _JSON_DECODER.raw_decode(text, start)[0]
+
+def salvage_questions(text: str) -> List[Dict[str, Any]]:
+    """
+    Decodes the complete question objects from a reply cut off mid-JSON (e.g. at
+    the output token limit), stopping at the first incomplete one.
+    """
+    key = text.find('"questions"')
+    i = text.find('[', key if key != -1 else 0)
+    if i == -1:
+        return []
+
+    questions = []
+    i += 1
+    while True:
+        while i < len(text) and text[i] in " \t\r\n,":
+            i += 1
+        if i >= len(text) or text[i] != '{':
+            break
+        try:
+            q, i = _JSON_DECODER.raw_decode(text, i)
+        except json.JSONDecodeError:
+            break
+        questions.append(q)
+    return questions
+
+OPT_PREFIXES = ("A)", "A.", "B)", "B.", "C)", "C.", "D)", "D.",
+                "a)", "a.", "b)", "b.", "c)", "c.", "d)", "d.")
+
+def _question_text(line: str):
+    """Returns the text after a "Q<n>:", "Q<n>." or "Q<n>-" marker, or None if the line has none."""
+    line = line.lstrip("*# ")
+    if not line.startswith(("Q", "q")):
+        return None
+
+    i = 1
+    while i < len(line) and line[i].isdigit():
+        i += 1
+    if i == 1 or i == len(line) or line[i] not in ":.-":
+        return None
+
+    return line[i + 1:].strip("* ")
+
+def _finish_question(block: Dict[str, Any]) -> Dict[str, Any]:
+    if block["answer"] is None:
+        block["answer"] = "Answer: Not provided"
+    return block
+
+def _normalize_question(q: Dict[str, Any]) -> Dict[str, Any]:
+    """Turns the prompt schema's {"A": "...", ...} options into "A) ..." radio labels."""
+    options = q.get("options", [])
+    if isinstance(options, dict):
+        q["options"] = [f"{letter}) {text}" for letter, text in options.items()]
+    return q
+
 def format_quiz(raw_text: str):
     questions = []
     
-    # Try to parse as JSON first (in case the model returns JSON)
+    # Try to parse as JSON first (the prompt asks for JSON)
     try:
-        if raw_text.strip().startswith('[') or raw_text.strip().startswith('{'):
-            quiz_data = json.loads(raw_text)
-            if isinstance(quiz_data, list):
-                return quiz_data
-            elif isinstance(quiz_data, dict) and 'questions' in quiz_data:
-                return quiz_data['questions']
+        quiz_data = extract_json(raw_text)
+        if isinstance(quiz_data, dict):
+            quiz_data = quiz_data.get('questions')
+        if isinstance(quiz_data, list) and all(isinstance(q, dict) for q in quiz_data):
+            return [_normalize_question(q) for q in quiz_data]
     except json.JSONDecodeError:
-        pass  # Not JSON, continue with regex parsing
+        # Truncated JSON still holds the questions that were finished
+        salvaged = salvage_questions(raw_text)
+        if salvaged:
+            return [_normalize_question(q) for q in salvaged]
+        # Otherwise not JSON, continue with line parsing
     
-    # Original regex parsing
-    parts = re.split(r"(?:Q\d+[:.-])", raw_text, flags=re.IGNORECASE)
+    # Single pass over the lines; a "Q<n>:" line starts a new question block
+    current = None
 
-    for part in parts:
-        if not part.strip():
+    for line in raw_text.splitlines():
+        line = line.strip()
+        if not line:
             continue
-        lines = [line.strip() for line in part.split("\n") if line.strip()]
 
-        if not lines:
-            continue
+        question_text = _question_text(line)
+        if question_text is not None:
+            if current:
+                questions.append(_finish_question(current))
+            current = {"question": question_text, "options": [], "answer": None}
+        elif current is None or current["answer"] is not None:
+            continue  # Preamble before the first question, or the block is already complete
+        elif not current["question"]:
+            current["question"] = line
+        elif line.startswith(OPT_PREFIXES):
+            current["options"].append(line)
+        elif "answer" in line.lower():
+            current["answer"] = line
 
-        question = lines[0]
-        options = [line for line in lines[1:] if re.match(r"^[A-Da-d][).]", line)]
-        answer = next((line for line in lines if "answer" in line.lower()), "Answer: Not provided")
+    if current:
+        questions.append(_finish_question(current))
 
-        questions.append({
-            "question": question,
-            "options": options,
-            "answer": answer
-        })
-    
     return questions
 
 # ------------------- QUIZ CREATION ------------------- #
-def create_quiz(topic: str, num_questions: int = 5):
-    prompt = f"""
-    Create {num_questions} multiple-choice quiz questions about {topic}.
-    Format each question exactly like this:
-    Q1: [Question text]
-    A) [Option A]
-    B) [Option B]
-    C) [Option C]
-    D) [Option D]
-    Answer: [Correct letter]
-    
-    Make sure the questions are clear and the answers are correct.
+def parse_quiz(provider: str, raw_output: str):
+    if provider == "gemini":
+        # Gemini runs in JSON mode, so there is nothing for format_quiz's line parser to
+        # recover; a reply only fails to parse when it was cut off at MAX_OUTPUT_TOKENS
+        try:
+            questions = orjson.loads(raw_output)["questions"]
+        except orjson.JSONDecodeError as e:
+            questions = salvage_questions(raw_output)
+            if not questions:
+                raise AIError(f"Gemini returned malformed quiz JSON: {str(e)}")
+        except (KeyError, TypeError) as e:
+            raise AIError(f"Gemini returned malformed quiz JSON: {str(e)}")
+        return [_normalize_question(q) for q in questions]
+    return format_quiz(raw_output)
+
+def _parsed_reply(keys: Dict[str, tuple], fetch: Callable[[], Tuple[str, str]]):
+    """
+    Returns (provider, raw reply, parsed quiz) from the first provider with a
+    cached reply under its key in ``keys``, or from ``fetch()`` on a miss. Only a
+    reply that parses into a non-empty quiz is stored, so a bad reply is retried
+    on the next click instead of replayed.
     """
+    for provider, key in keys.items():
+        raw = _lookup_response(key)
+        if raw is not None:
+            return provider, raw, parse_quiz(provider, raw)
+
+    provider, raw = fetch()
+    quiz_data = parse_quiz(provider, raw)
+    if quiz_data:
+        _store_response(keys[provider], raw)
+    return provider, raw, quiz_data
+
+def create_quiz(topic: str, difficulty: str = "Medium", num_questions: int = 5, placeholder=None):
+    prompt = build_quiz_prompt(topic, difficulty, num_questions)
+    providers = active_providers()
     
     try:
-        raw_output = generate_gemini_response(prompt, GEMINI_API_KEY)
-        quiz_data = format_quiz(raw_output)
+        provider, raw_output, quiz_data = _parsed_reply(
+            {p: (p, prompt, PROVIDER_MODELS[p]) for p in providers},
+            lambda: generate_text(providers, prompt, placeholder))
         
         # If we got empty quiz data, raise an error
         if not quiz_data:
             raise AIError("AI-generated quiz was empty or invalid.")
+        
+        # Came up short (fewer questions, or a reply truncated after its last complete
+        # question): ask the same provider for just the missing ones instead of starting over
+        have = len(quiz_data)
+        if have < num_questions:
+            followup = (f"Continue with Q{have + 1}..Q{num_questions} only, "
+                        f"as {num_questions - have} new questions in the same JSON format.")
+            model_id = PROVIDER_MODELS[provider]
+            try:
+                _, _, more = _parsed_reply(
+                    {provider: (provider, prompt, raw_output, followup, model_id)},
+                    lambda: (provider, continue_response(provider, prompt, raw_output, followup,
+                                                         model_id, PROVIDER_KEYS[provider])))
+                quiz_data += more
+            except AIError:
+                pass  # A shorter quiz is better than none; nothing was cached, so a retry asks again
             
         return quiz_data[:num_questions]  # Ensure we return only the requested number
     
@@ -124,72 +373,41 @@ def create_quiz(topic: str, num_questions: int = 5):
 st.set_page_config(page_title="Quiz Generator 🎯", page_icon="📘", layout="centered")
 
 st.title("📘 AI Quiz Generator")
-st.write("Enter a topic and generate an interactive quiz powered by Google Gemini!")
+st.write(f"Enter a topic and generate an interactive quiz powered by {PROVIDER_NAMES[PROVIDER]}!")
 
 # Add API key input field if not set in environment
-if not GEMINI_API_KEY:
-    GEMINI_API_KEY = st.text_input("Google AI Studio API Key", type="password")
-    st.info("Get your API key from https://aistudio.google.com/app/apikey")
-    st.info("Using model: Gemini 1.5 Flash")
+if not API_KEY:
+    if PROVIDER == "hf":
+        API_KEY = st.text_input("Hugging Face API Token", type="password")
+        st.info("Get your token from https://huggingface.co/settings/tokens")
+    else:
+        API_KEY = st.text_input("Google AI Studio API Key", type="password")
+        st.info("Get your API key from https://aistudio.google.com/app/apikey")
+    PROVIDER_KEYS[PROVIDER] = API_KEY
+    st.info(f"Using model: {MODEL_ID}")
 
 topic = st.text_input("Enter topic", placeholder="e.g. Python, Databases, Cybersecurity")
+difficulty = st.selectbox("Difficulty", ["Easy", "Medium", "Hard"], index=1)
 num_questions = st.slider("Number of questions", 2, 10, 5)
 
 if st.button("Generate Quiz"):
-    if not GEMINI_API_KEY:
-        st.error("❌ Google API Key is required. Please enter your key above.")
+    if not API_KEY:
+        st.error(f"❌ {PROVIDER_NAMES[PROVIDER]} API key is required. Please enter your key above.")
     elif not topic.strip():
         st.error("❌ Please enter a topic for your quiz.")
     else:
         with st.spinner("⚡ Generating quiz..."):
             try:
-                quiz = create_quiz(topic, num_questions)
+                quiz = create_quiz(topic, difficulty, num_questions, placeholder=st.empty())
                 st.session_state.quiz = quiz
+                st.session_state.topic = topic
                 st.session_state.answers = {}
+                st.session_state.submitted = False
                 st.success("✅ Quiz generated successfully!")
             except AIError as e:
                 st.error(f"❌ Failed to generate quiz: {str(e)}")
-                st.info("💡 Tip: Make sure your Google API key is valid.")
+                st.info(f"💡 Tip: Make sure your {PROVIDER_NAMES[PROVIDER]} API key is valid.")
 
 # ------------------- QUIZ DISPLAY ------------------- #
 if "quiz" in st.session_state:
-    st.subheader("📝 Quiz Time!")
-    st.write(f"Topic: {topic}")
-
-    for idx, q in enumerate(st.session_state.quiz, 1):
-        st.markdown(f"**Q{idx}: {q['question']}**")
-
-        # Show radio options
-        choice = st.radio(
-            f"Select your answer for Q{idx}",
-            q["options"],
-            key=f"q{idx}",
-            index=None
-        )
-        st.session_state.answers[f"Q{idx}"] = choice
-
-    if st.button("Submit Quiz"):
-        score = 0
-        st.subheader("📊 Results")
-
-        for idx, q in enumerate(st.session_state.quiz, 1):
-            user_ans = st.session_state.answers.get(f"Q{idx}")
-            correct_ans = q["answer"]
-            
-            # Extract just the letter from the answer
-            correct_letter = re.search(r"[A-D]", correct_ans.upper())
-            correct_letter = correct_letter.group(0) if correct_letter else ""
-
-            if user_ans and user_ans[0].upper() == correct_letter:
-                st.success(f"Q{idx}: ✅ Correct ({user_ans})")
-                score += 1
-            else:
-                st.error(f"Q{idx}: ❌ Incorrect (Your answer: {user_ans} | Correct: {correct_ans})")
-
-        st.info(f"🏆 Final Score: {score}/{len(st.session_state.quiz)}")
-        
-        # Add option to generate a new quiz
-        if st.button("Generate New Quiz"):
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
-            st.experimental_rerun()
+    render_quiz()
@@ -1,23 +1,49 @@
-def build_quiz_prompt(topic: str, difficulty: str, n: int) -> str:
-    return f"""
-You are a quiz generator. Create {n} multiple-choice questions on the topic "{topic}".
-Difficulty: {difficulty}.
+from functools import lru_cache
+from typing import List, TypedDict
+
+# Fixed instructions go first so every prompt shares the same prefix
+_SCHEMA = """
+You are a quiz generator. Create multiple-choice questions for the request at the end.
 Each question must include exactly 4 options labeled A, B, C, D and provide the correct option letter.
 Return ONLY valid JSON with this schema:
 
-{{
-  "topic": "{topic}",
-  "difficulty": "{difficulty}",
+{
+  "topic": "string",
+  "difficulty": "string",
   "questions": [
-    {{
+    {
       "question": "string",
-      "options": {{"A": "string", "B": "string", "C": "string", "D": "string"}},
+      "options": {"A": "string", "B": "string", "C": "string", "D": "string"},
       "answer": "A|B|C|D",
       "explanation": "short explanation"
-    }}
+    }
   ]
-}}
+}
 
 Do not include backticks or commentary. Return JSON only.
 """
 
+# The same schema as a type, for providers with server-side structured output
+class QuizOptions(TypedDict):
+    A: str
+    B: str
+    C: str
+    D: str
+
+class QuizQuestion(TypedDict):
+    question: str
+    options: QuizOptions
+    answer: str
+    explanation: str
+
+class QuizSchema(TypedDict):
+    topic: str
+    difficulty: str
+    questions: List[QuizQuestion]
+
+@lru_cache(maxsize=128)
+def build_quiz_prompt(topic: str, difficulty: str, n: int) -> str:
+    return _SCHEMA + f"""
+Request: {n} questions on the topic "{topic}".
+Difficulty: {difficulty}.
+"""
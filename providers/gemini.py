@@ -1,15 +1,83 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from functools import lru_cache
+from typing import Iterator
+
 import google.generativeai as genai
+from google.generativeai import client as genai_client
+from tenacity import retry, retry_if_exception_type, stop_after_attempt
+
+# Per-attempt wait for the first chunk; slow starts are retried instead of waiting out the latency tail
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))
+# Deadline for the whole RPC, long enough for a full quiz to finish streaming
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "120"))
+
+# generate_content(stream=True) returns once the first chunk is in, so running it
+# here lets us cap that wait separately from the RPC deadline. An abandoned
+# attempt keeps its worker until GENERATION_TIMEOUT at most.
+_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini")
 
 class GeminiError(Exception):
     pass
 
-def generate(prompt: str, api_key: str, model_id: str = "gemini-1.5-flash", max_output_tokens: int = 512, temperature: float = 0.7) -> str:
-    if not api_key:
-        raise GeminiError("Missing GOOGLE_API_KEY.")
-    genai.configure(api_key=api_key)
+# genai.configure() swaps process-wide state, so configuring and creating a client must not interleave
+_CONFIGURE_LOCK = threading.Lock()
+
+@lru_cache(maxsize=4)
+def _get_model(api_key: str, model_id: str):
+    # Configure the SDK and build the model once per (key, model) instead of on every call.
+    # The model would otherwise pick up whatever client is configured at its first call,
+    # which may belong to another session's key, so bind this key's client right away.
+    with _CONFIGURE_LOCK:
+        genai.configure(api_key=api_key)
+        client = genai_client.get_default_generative_client()
     model = genai.GenerativeModel(model_id)
-    resp = model.generate_content(prompt, generation_config={"temperature": temperature, "max_output_tokens": max_output_tokens})
-    if not resp or not resp.text:
+    # Private SDK attribute (pinned range in requirements.txt); fail loudly if it goes away
+    assert hasattr(model, "_client"), "google-generativeai no longer has GenerativeModel._client; re-check _get_model"
+    model._client = client
+    return model
+
+@retry(retry=retry_if_exception_type(FutureTimeout), stop=stop_after_attempt(3), reraise=True)
+def _first_chunk(start, request_timeout):
+    return _EXECUTOR.submit(start).result(timeout=request_timeout)
+
+def _stream_text(start, request_timeout) -> Iterator[str]:
+    try:
+        resp = _first_chunk(start, request_timeout)
+    except FutureTimeout:
+        raise GeminiError(f"Gemini sent nothing within {request_timeout:g}s on 3 attempts.")
+    got_text = False
+    for chunk in resp:
+        if chunk.text:
+            got_text = True
+            yield chunk.text
+    if not got_text:
         raise GeminiError("Empty response from Gemini.")
-    return resp.text.strip()
 
+def _generation_config(max_output_tokens: int, temperature: float, response_schema=None) -> genai.types.GenerationConfig:
+    if response_schema is None:
+        return genai.types.GenerationConfig(temperature=temperature, max_output_tokens=max_output_tokens)
+    # JSON mode: the server guarantees output that parses and matches the schema
+    return genai.types.GenerationConfig(temperature=temperature, max_output_tokens=max_output_tokens, response_mime_type="application/json", response_schema=response_schema)
+
+def stream_generate(prompt: str, api_key: str, model_id: str = "gemini-1.5-flash", max_output_tokens: int = 512, temperature: float = 0.7, request_timeout: float = REQUEST_TIMEOUT, response_schema=None) -> Iterator[str]:
+    if not api_key:
+        raise GeminiError("Missing GOOGLE_API_KEY.")
+    model = _get_model(api_key, model_id)
+    config = _generation_config(max_output_tokens, temperature, response_schema)
+    yield from _stream_text(lambda: model.generate_content(prompt, generation_config=config, stream=True, request_options={"timeout": GENERATION_TIMEOUT}), request_timeout)
+
+def generate(prompt: str, api_key: str, model_id: str = "gemini-1.5-flash", max_output_tokens: int = 512, temperature: float = 0.7, request_timeout: float = REQUEST_TIMEOUT, response_schema=None) -> str:
+    return "".join(stream_generate(prompt, api_key, model_id, max_output_tokens, temperature, request_timeout, response_schema)).strip()
+
+def continue_generate(prompt: str, previous: str, followup: str, api_key: str, model_id: str = "gemini-1.5-flash", max_output_tokens: int = 512, temperature: float = 0.7, request_timeout: float = REQUEST_TIMEOUT, response_schema=None) -> str:
+    # Follow-up turn in a chat whose history is the original prompt and reply, so the model continues rather than starting over
+    if not api_key:
+        raise GeminiError("Missing GOOGLE_API_KEY.")
+    model = _get_model(api_key, model_id)
+    chat = model.start_chat(history=[{"role": "user", "parts": [prompt]}, {"role": "model", "parts": [previous]}])
+    config = _generation_config(max_output_tokens, temperature, response_schema)
+    # Streamed as well, so it gets the same short first-chunk wait and long total deadline
+    return "".join(_stream_text(lambda: chat.send_message(followup, generation_config=config, stream=True, request_options={"timeout": GENERATION_TIMEOUT}), request_timeout)).strip()
@@ -1,11 +1,111 @@
+import os
+from functools import lru_cache
+from typing import Dict, Iterator
+
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from tenacity import retry, retry_if_exception_type, stop_after_attempt
+
+# Per-attempt wait for headers / the next streamed bytes; slow starts are retried
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))
+# Read deadline for non-streaming calls, which send nothing until generation finishes
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "120"))
+
+# One pooled keep-alive session so repeated calls skip the TCP/TLS handshake
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(max_retries=0, pool_connections=4, pool_maxsize=16))
 
 class HFError(Exception):
     """Custom error class for Hugging Face API failures."""
     pass
 
 
-def generate(prompt: str, hf_token: str, model_id: str) -> str:
+@lru_cache(maxsize=8)
+def _auth_headers(hf_token: str) -> Dict[str, str]:
+    """Builds the Authorization header once per token."""
+    return {"Authorization": f"Bearer {hf_token}"}
+
+
+@retry(retry=retry_if_exception_type(requests.exceptions.Timeout), stop=stop_after_attempt(3), reraise=True)
+def _post_stream(url: str, headers: Dict[str, str], payload: dict, timeout: float) -> requests.Response:
+    """Opens a streaming POST through the pooled session, retrying up to 3 times if it is slow to start."""
+    return _SESSION.post(url, headers=headers, json=payload, timeout=timeout, stream=True)
+
+
+@retry(retry=retry_if_exception_type(requests.exceptions.ConnectTimeout), stop=stop_after_attempt(3), reraise=True)
+def _post(url: str, headers: Dict[str, str], payload: dict, timeout) -> requests.Response:
+    """POSTs through the pooled session, retrying up to 3 times if the connection times out."""
+    return _SESSION.post(url, headers=headers, json=payload, timeout=timeout)
+
+
+def _raise_if_loading(response: requests.Response) -> None:
+    """Raise HFError with the estimated wait time if the model is still loading."""
+    if response.status_code == 503:
+        # Extract estimated time if available
+        est_time = "unknown"
+        try:
+            data = response.json()
+            if "estimated_time" in data:
+                est_time = f"{data['estimated_time']:.1f}"
+        except:
+            pass
+        raise HFError(f"Model is loading. Please try again in {est_time} seconds.")
+
+
+def stream_generate(prompt: str, hf_token: str, model_id: str, request_timeout: float = REQUEST_TIMEOUT, max_new_tokens: int = 1024) -> Iterator[str]:
+    """
+    Streams tokens from the Hugging Face Inference API (TGI server-sent events).
+
+    Args:
+        prompt (str): The input text / instruction.
+        hf_token (str): Hugging Face API token (hf_xxx).
+        model_id (str): The Hugging Face model repo ID.
+        request_timeout (float): Seconds to wait between received bytes before retrying.
+        max_new_tokens (int): Maximum tokens to generate.
+
+    Yields:
+        str: The text of each generated token as it arrives.
+
+    Raises:
+        HFError: If the API call fails or Hugging Face returns an error.
+    """
+    url = f"https://api-inference.huggingface.co/models/{model_id}"
+    headers = _auth_headers(hf_token)
+
+    try:
+        with _post_stream(
+            url,
+            headers,
+            {"inputs": prompt, "parameters": {"return_full_text": False, "max_new_tokens": max_new_tokens}, "stream": True},
+            timeout=request_timeout,
+        ) as response:
+            _raise_if_loading(response)
+            response.raise_for_status()
+
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                event = orjson.loads(line[len(b"data:"):])
+
+                # Handle Hugging Face error message sent mid-stream
+                if "error" in event:
+                    raise HFError(event["error"])
+
+                token = event.get("token") or {}
+                if token.get("special"):
+                    continue
+                text = token.get("text")
+                if text:
+                    yield text
+
+    except requests.exceptions.RequestException as e:
+        raise HFError(f"Request failed: {e}")
+    except orjson.JSONDecodeError as e:
+        raise HFError(f"Malformed stream event: {e}")
+
+
+def generate(prompt: str, hf_token: str, model_id: str, request_timeout: float = REQUEST_TIMEOUT) -> str:
     """
     Calls the Hugging Face Inference API with the given prompt.
 
@@ -13,6 +113,8 @@ def generate(prompt: str, hf_token: str, model_id: str) -> str:
         prompt (str): The input text / instruction.
         hf_token (str): Hugging Face API token (hf_xxx).
         model_id (str): The Hugging Face model repo ID.
+        request_timeout (float): Seconds to wait for a connection before retrying; the
+            response itself may take up to GENERATION_TIMEOUT.
 
     Returns:
         str: The generated text from the model.
@@ -21,30 +123,16 @@ def generate(prompt: str, hf_token: str, model_id: str) -> str:
         HFError: If the API call fails or Hugging Face returns an error.
     """
     url = f"https://api-inference.huggingface.co/models/{model_id}"
-    headers = {"Authorization": f"Bearer {hf_token}"}
+    headers = _auth_headers(hf_token)
 
     try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json={"inputs": prompt},
-            timeout=60,
-        )
+        response = _post(url, headers, {"inputs": prompt}, timeout=(request_timeout, GENERATION_TIMEOUT))
         
         # Check if the model is still loading
-        if response.status_code == 503:
-            # Extract estimated time if available
-            est_time = "unknown"
-            try:
-                data = response.json()
-                if "estimated_time" in data:
-                    est_time = f"{data['estimated_time']:.1f}"
-            except:
-                pass
-            raise HFError(f"Model is loading. Please try again in {est_time} seconds.")
+        _raise_if_loading(response)
         
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
 
         # Handle Hugging Face error message
         if isinstance(data, dict) and "error" in data:
@@ -68,3 +156,6 @@ def generate(prompt: str, hf_token: str, model_id: str) -> str:
 
     except requests.exceptions.RequestException as e:
         raise HFError(f"Request failed: {e}")
+    except orjson.JSONDecodeError as e:
+        raise HFError(f"Invalid JSON response: {e}")
+
@@ -0,0 +1,68 @@
+import streamlit as st
+from typing import Any, Dict, List
+
+# ------------------- SCORING ------------------- #
+def answer_letter(answer: str) -> str:
+    """Returns the first standalone A-D letter in an answer like "Answer: B", or "" if there is none."""
+    text = f" {answer.upper()} "
+    return next((c for i, c in enumerate(text)
+                 if c in "ABCD" and not text[i - 1].isalpha() and not text[i + 1].isalpha()), "")
+
+def score_quiz(quiz: List[Dict[str, Any]], answers: Dict[str, str]) -> int:
+    """Shows a correct/incorrect line per question and returns the number answered correctly."""
+    score = 0
+    st.subheader("📊 Results")
+
+    for idx, q in enumerate(quiz, 1):
+        user_ans = answers.get(f"Q{idx}")
+        correct_ans = q["answer"]
+        
+        # Extract just the letter from the answer
+        correct_letter = answer_letter(correct_ans)
+
+        if user_ans and user_ans[0].upper() == correct_letter:
+            st.success(f"Q{idx}: ✅ Correct ({user_ans})")
+            score += 1
+        else:
+            st.error(f"Q{idx}: ❌ Incorrect (Your answer: {user_ans} | Correct: {correct_ans})")
+
+        if q.get("explanation"):
+            st.caption(q["explanation"])
+
+    st.info(f"🏆 Final Score: {score}/{len(quiz)}")
+    return score
+
+# ------------------- QUIZ DISPLAY ------------------- #
+@st.fragment
+def render_quiz():
+    """
+    Renders the quiz in st.session_state as radio questions with a Submit button.
+    As a fragment, picking an answer reruns only this function, not the whole app.
+    """
+    st.subheader("📝 Quiz Time!")
+    st.write(f"Topic: {st.session_state.get('topic', '')}")
+
+    for idx, q in enumerate(st.session_state.quiz, 1):
+        st.markdown(f"**Q{idx}: {q['question']}**")
+
+        # Show radio options
+        choice = st.radio(
+            f"Select your answer for Q{idx}",
+            q["options"],
+            key=f"q{idx}",
+            index=None
+        )
+        st.session_state.answers[f"Q{idx}"] = choice
+
+    # A button is only True on the run right after its click, so remember the submit
+    if st.button("Submit Quiz"):
+        st.session_state.submitted = True
+
+    if st.session_state.get("submitted"):
+        score_quiz(st.session_state.quiz, st.session_state.answers)
+        
+        # Add option to generate a new quiz
+        if st.button("Generate New Quiz"):
+            for key in list(st.session_state.keys()):
+                del st.session_state[key]
+            st.rerun()  # full-app rerun, not just this fragment